@@ -1,16 +1,21 @@
 import uvicorn
-from fastapi import FastAPI, UploadFile, File, HTTPException, BackgroundTasks, Query
-from fastapi.responses import JSONResponse, StreamingResponse
+from fastapi import FastAPI, Response, UploadFile, File, HTTPException, BackgroundTasks, Query
+from fastapi.responses import FileResponse, ORJSONResponse, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
+from starlette.middleware.gzip import GZipMiddleware
 
 import os
 import sys
 import asyncio
 import random
-import json
+import types
 import uuid
+
+import orjson
+import aiofiles
+from cachetools import TTLCache
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
-from io import BytesIO
 
 from datetime import datetime
 
@@ -20,13 +25,6 @@ from scipy.stats import pearsonr
 
 from matplotlib import pyplot as plt
 
-from tabulate import tabulate
-
-
-from rich.traceback import install
-install()
-from rich import print
-
 from loguru import logger
 logger.remove()
 log_level = "DEBUG"
@@ -34,7 +32,8 @@ log_format_stdout = "<blue>{time:%Y-%m-%d %I:%M:%S %p %Z}</blue> | <level>{level
 logger.add(sys.stderr, level=log_level, format=log_format_stdout, colorize=True, backtrace=False, diagnose=False)
 
 
-app = FastAPI()
+# ORJSONResponse bypasses jsonable_encoder + stdlib json for every dict return
+app = FastAPI(default_response_class=ORJSONResponse)
 
 app.add_middleware(
     CORSMiddleware,
@@ -45,11 +44,101 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Compress large JSON responses on the wire. Explicitly exclude
+# already-deflated PDFs (recompressing burns CPU and forfeits the
+# FileResponse sendfile path) and SSE streams: recent starlette skips
+# text/event-stream on its own, but with unpinned deps we don't rely on
+# that — older versions would buffer the stream for compression.
+app.add_middleware(GZipMiddleware, minimum_size=1024, compresslevel=5,
+                   exclude_content_types=("application/pdf", "text/event-stream"))
+
 
 import ninjapivot as ninja
 
-# Global in-memory storage for job statuses
-jobs = {}
+# Job state lives in Redis when NINJAPIVOT_REDIS_URL is set, which lets the
+# server run with workers > 1 (SSE and upload can land on different
+# processes). Without it we fall back to the in-process jobs dict below,
+# which is fine for the single-worker default.
+REDIS_URL = os.environ.get("NINJAPIVOT_REDIS_URL")
+if REDIS_URL:
+    import redis.asyncio as aioredis
+    redis_jobs = aioredis.from_url(REDIS_URL, decode_responses=True)
+else:
+    redis_jobs = None
+
+JOB_TTL_SECONDS = 3600
+
+# In-memory storage for job statuses (single-worker fallback). TTL + LRU
+# eviction keeps memory bounded: completed jobs age out after an hour and
+# the SSE loop already treats a missing job as end-of-stream.
+jobs = TTLCache(maxsize=10_000, ttl=JOB_TTL_SECONDS)
+
+# Report generation (pandas + matplotlib + LaTeX) is CPU-heavy; running it
+# in worker processes keeps the API process purely I/O-bound so one big
+# report can't starve SSE streams or uploads.
+REPORT_POOL = ProcessPoolExecutor(max_workers=max(1, (os.cpu_count() or 2) - 1))
+
+def _job_key(job_id: str) -> str:
+    return f"job:{job_id}"
+
+def _job_channel(job_id: str) -> str:
+    return f"job:{job_id}:events"
+
+
+async def create_job(job_id: str):
+    """
+    Registers a freshly accepted job in the job store.
+    """
+    status_message = get_humorous_status("accepted")
+    if redis_jobs:
+        await redis_jobs.hset(_job_key(job_id), mapping={
+            "progress": 0,
+            "status_message": status_message,
+            "is_complete": 0,
+        })
+        await redis_jobs.expire(_job_key(job_id), JOB_TTL_SECONDS)
+    else:
+        jobs[job_id] = {
+            "progress": 0,
+            "status_message": status_message,
+            "is_complete": False,
+            "event": asyncio.Event()
+        }
+
+
+async def get_job(job_id: str):
+    """
+    Returns the current state of a job as a dict, or None if unknown.
+    """
+    if redis_jobs:
+        state = await redis_jobs.hgetall(_job_key(job_id))
+        if not state:
+            return None
+        return {
+            "progress": int(state.get("progress", 0)),
+            "status_message": state.get("status_message", "Processing..."),
+            "is_complete": state.get("is_complete") == "1",
+            "pdf_path": state.get("pdf_path"),
+            "error": state.get("error"),
+        }
+    return jobs.get(job_id)
+
+
+async def set_job_fields(job_id: str, **fields):
+    """
+    Updates fields of a job's state and notifies any listening SSE streams
+    (Redis PUBLISH, or the in-process asyncio.Event).
+    """
+    if redis_jobs:
+        mapping = {k: (int(v) if isinstance(v, bool) else v)
+                   for k, v in fields.items() if v is not None}
+        await redis_jobs.hset(_job_key(job_id), mapping=mapping)
+        await redis_jobs.publish(_job_channel(job_id), "update")
+    else:
+        job = jobs.get(job_id)
+        if job:
+            job.update(fields)
+            job["event"].set()
 
 # Dictionary of humorous status messages for each processing stage
 STATUS_MESSAGES = {
@@ -92,12 +181,32 @@ STATUS_MESSAGES = {
         "Your data has reached its final form. Ready for download!"
     ]
 }
+# Freeze the message pools once at import: random.choice on a tuple is
+# faster, the per-call fallback list allocation goes away, and the mapping
+# proxy keeps anything from mutating the table at runtime.
+STATUS_MESSAGES = types.MappingProxyType(
+    {stage: tuple(messages) for stage, messages in STATUS_MESSAGES.items()})
+
+_FALLBACK_STATUS = ("Processing…",)
+
+# Module-level Random instance sidesteps the shared global one
+_status_rng = random.Random()
 
 def get_humorous_status(stage: str) -> str:
     """
     Returns a random humorous status message based on the given stage.
     """
-    return random.choice(STATUS_MESSAGES.get(stage, ["Processing…"]))
+    return _status_rng.choice(STATUS_MESSAGES.get(stage, _FALLBACK_STATUS))
+
+
+async def update_job_status(job_id: str, stage: str, progress: int):
+    """
+    Updates a job's progress and humorous status message, then wakes any
+    SSE streams listening on the job.
+    """
+    await set_job_fields(job_id,
+                         status_message=get_humorous_status(stage),
+                         progress=progress)
 
 
 
@@ -107,88 +216,141 @@ async def process_job(job_id: str, file: Path):
     """
     Simulates CSV processing and PDF report generation while updating job status with humorous messages.
     """
-    job = jobs[job_id]
     try:
-        # Example processing steps with humorous updates:
-        # steps = [
-        #     ("validating", 20),
-        #     ("analyzing", 50),
-        #     ("generating", 80),
-        #     ("finalizing", 95)
-        # ]
-        # for stage, progress in steps:
-        #     job["status_message"] = get_humorous_status(stage)
-        #     job["progress"] = progress
-        #     await asyncio.sleep(3)  # Simulate processing delay
-
-        #await asyncio.sleep(2)
-        
-        job["status_message"] = get_humorous_status("validating")
-        job["progress"] = 20
+        await update_job_status(job_id, "validating", 20)
         await asyncio.sleep(1)
-        
 
-        job["status_message"] = get_humorous_status("analyzing")
-        job["progress"] = 40
-        await asyncio.sleep(1)
-        
-        df = pd.read_csv(file)
-        
+
+        await update_job_status(job_id, "analyzing", 40)
+
+        # Parse off the event loop; the pyarrow engine is multi-threaded C++
+        # and considerably faster than the default C parser on wide CSVs.
+        df = await asyncio.to_thread(ninja.load_csv, file)
+
         # generate the PDF
-        job["status_message"] = get_humorous_status("generating")
-        job["progress"] = 60
+        await update_job_status(job_id, "generating", 60)
 
-        pdf_path = ninja.gen_latex_document(job_id,  df)
+        loop = asyncio.get_running_loop()
+        pdf_path = await loop.run_in_executor(REPORT_POOL,
+                                              ninja.gen_latex_document,
+                                              job_id, df)
 
 
         logger.info(f"Generated PDF report: {pdf_path}")
 
-        job["status_message"] = get_humorous_status("finalizing")
-        job["progress"] = 95
-        await asyncio.sleep(1)
-        
-        # load the PDF into memory
-        with open(pdf_path, "rb") as f:
-            job["pdf"] = f.read()
-    
+        await update_job_status(job_id, "finalizing", 95)
+
+        # record where the PDF lives; /result streams it from disk
+        await set_job_fields(job_id, pdf_path=str(pdf_path), is_complete=True)
+        await update_job_status(job_id, "complete", 100)
+
 
-        # # Finalizing step
-        job["status_message"] = get_humorous_status("complete")
-        job["progress"] = 100
-        job["is_complete"] = True
-        
-        await asyncio.sleep(2)
-        
-        
     except Exception as e:
-        raise e
-        job["error"] = str(e)
-        job["status_message"] = "Failed"
-        job["is_complete"] = False
+        await set_job_fields(job_id,
+                             error=str(e),
+                             status_message="Failed",
+                             is_complete=False)
+        raise
+
+
+def _job_snapshot(job_id: str, job: dict) -> dict:
+    """
+    Builds the SSE payload for a job's current state.
+    """
+    return {
+        "timestamp": asyncio.get_running_loop().time(),
+        "job_id": job_id,
+        "progress": job.get("progress", 0),
+        "status_message": job.get("status_message", "Processing..."),
+        "is_complete": job.get("is_complete", False),
+    }
+
+
+def _sse_dump(data: dict) -> bytes:
+    """
+    Serializes one SSE message with orjson (~5x faster than stdlib json and
+    handles datetime/UUID natively). StreamingResponse accepts bytes directly,
+    so we skip the str concat + UTF-8 re-encode entirely.
+    """
+    return b"data: " + orjson.dumps(data, default=str) + b"\n\n"
 
 
-# SSE endpoint to stream the actual job progress
+# SSE endpoint to stream the actual job progress.
+# Push-driven: process_job sets the per-job Event on every status transition,
+# so clients see updates immediately instead of on a 1 s polling cadence and
+# nothing is re-serialized while the job is idle.
 async def job_progress(job_id: str):
+    if redis_jobs:
+        # Multi-worker path: the job may be progressing in another process,
+        # so listen for its PUBLISHed updates.
+        pubsub = redis_jobs.pubsub()
+        await pubsub.subscribe(_job_channel(job_id))
+        try:
+            sent_initial = False
+            while True:
+                if sent_initial:
+                    msg = await pubsub.get_message(ignore_subscribe_messages=True,
+                                                   timeout=15)
+                    if msg is None:
+                        if await get_job(job_id) is None:
+                            break
+                        # SSE comment keep-alive so proxies don't drop idle streams
+                        yield b": keep-alive\n\n"
+                        continue
+                job = await get_job(job_id)
+                if not job:
+                    break
+                yield _sse_dump(_job_snapshot(job_id, job))
+                sent_initial = True
+        finally:
+            await pubsub.unsubscribe(_job_channel(job_id))
+            await pubsub.aclose()
+        return
+
+    sent_initial = False
     while True:
         job = jobs.get(job_id)
         if not job:
             break
-        data = {
-            "timestamp": asyncio.get_running_loop().time(),
-            "job_id": job_id,
-            "progress": job.get("progress", 0),
-            "status_message": job.get("status_message", "Processing..."),
-            "is_complete": job.get("is_complete", False),
-        }
-        logger.debug(f"Sending SSE data: {data}")
-        yield f"data: {json.dumps(data)}\n\n"
-        await asyncio.sleep(1)
+        if sent_initial:
+            try:
+                await asyncio.wait_for(job["event"].wait(), timeout=15)
+                job["event"].clear()
+            except asyncio.TimeoutError:
+                # SSE comment keep-alive so proxies don't drop idle streams
+                yield b": keep-alive\n\n"
+                continue
+        data = _job_snapshot(job_id, job)
+        # positional form defers formatting until the sink actually wants it
+        logger.debug("Sending SSE data: {}", data)
+        yield _sse_dump(data)
+        sent_initial = True
 
 @app.get("/sse/job_progress/{job_id}")
 async def sse_endpoint(job_id: str):
     return StreamingResponse(job_progress(job_id), media_type="text/event-stream")
 
 
+# Demo rows for the dashboard grid. Constant data, so the payload is
+# serialized once at import and the handler returns the same bytes every
+# time — zero allocations on the hot path.
+_HELLO_PAYLOAD = {
+    "data": [
+        {"make": "Tesla", "model": "Model Y", "price": 64950, "electric": True},
+        {"make": "Ford", "model": "F-Series", "price": 33850, "electric": False},
+        {"make": "Toyota", "model": "Corolla", "price": 29600, "electric": False},
+    ]
+}
+_HELLO_BYTES = orjson.dumps(_HELLO_PAYLOAD)
+_HELLO_HEADERS = {"cache-control": "public, max-age=60"}
+
+@app.get("/api/hello")
+async def read_root():
+    return Response(content=_HELLO_BYTES,
+                    media_type="application/json",
+                    headers=_HELLO_HEADERS)
+
+
 @app.post("/upload")
 async def upload_csv(file: UploadFile = File(...), background_tasks: BackgroundTasks = None):
     """
@@ -199,24 +361,22 @@ async def upload_csv(file: UploadFile = File(...), background_tasks: BackgroundT
     
     # Create a unique job identifier
     job_id = str(uuid.uuid4())
-    jobs[job_id] = {
-        "progress": 0,
-        "status_message": get_humorous_status("accepted"),
-        "is_complete": False,
-        "pdf": None
-    }
+    await create_job(job_id)
     
     # Save the uploaded file to a temporary directory
     file_path = ninja.CACHE_DIR / job_id
     file_path.mkdir(parents=True, exist_ok=True)
     file_path = file_path / file.filename
-    with open(file_path, "wb") as f:
-        f.write(file.file.read())
+    # Stream to disk in 1 MiB chunks: bounded memory for arbitrarily large
+    # uploads, and aiofiles keeps the disk writes off the event loop.
+    async with aiofiles.open(file_path, "wb") as f:
+        while chunk := await file.read(1 << 20):
+            await f.write(chunk)
     
     # Start background processing using our process_job function
     background_tasks.add_task(process_job, job_id, file_path)
     
-    return JSONResponse(status_code=201, content={"job_id": job_id, "message": "File accepted for processing."})
+    return ORJSONResponse(status_code=201, content={"job_id": job_id, "message": "File accepted for processing."})
 
 
 
@@ -227,20 +387,20 @@ async def get_result(job_id: str, download: bool = Query(False)):
     Returns the generated PDF report for a completed job.
     If 'download=true' is provided as a query parameter, the PDF is sent with a Content-Disposition header to prompt a download.
     """
-    job = jobs.get(job_id)
+    job = await get_job(job_id)
     if not job or not job.get("is_complete"):
         raise HTTPException(status_code=404, detail="No results available for this job")
-    if not job.get("pdf"):
+    pdf_path = job.get("pdf_path")
+    if not pdf_path or not Path(pdf_path).exists():
         raise HTTPException(status_code=500, detail="PDF generation failed")
-    
-    pdf_bytes = job["pdf"]
-    response = StreamingResponse(BytesIO(pdf_bytes), media_type="application/pdf")
+
+    # FileResponse streams from disk with zero-copy sendfile(2) and handles
+    # Range requests; nothing is buffered in process memory.
+    response = FileResponse(pdf_path, media_type="application/pdf")
     if download:
         response.headers["Content-Disposition"] = "attachment; filename=report.pdf"
     else:
         response.headers["Content-Disposition"] = "inline; filename=report.pdf"
-        
-    # jobs[job_id] = None
 
     return response
 
@@ -248,4 +408,15 @@ async def get_result(job_id: str, download: bool = Query(False)):
 
 
 if __name__ == "__main__":
-    uvicorn.run(app, host="127.0.0.1", port=8000)
+    # uvloop + httptools replace the default asyncio loop and Python HTTP parser.
+    # Keep workers=1 by default: the jobs dict is in-process, so SSE and upload
+    # must land on the same worker. Override with WEB_CONCURRENCY once job state
+    # moves to a shared store.
+    uvicorn.run("api_server:app",
+                host="127.0.0.1",
+                port=8000,
+                loop="uvloop",
+                http="httptools",
+                workers=int(os.environ.get("WEB_CONCURRENCY", 1)),
+                limit_concurrency=1000,
+                timeout_keep_alive=30)